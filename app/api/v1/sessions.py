@@ -1,19 +1,24 @@
 # app/api/v1/sessions.py
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, File, HTTPException, Response, UploadFile
 from pydantic import BaseModel, Field
 from typing import Optional
 from sqlmodel import select
-from app.services.ai_pipeline import run_asr, run_tts, generate_reply
+from app.services.ai_pipeline import run_asr, run_tts, generate_reply, MODEL_ID as ASR_MODEL_ID
+from app.api.v1.tools import MCPPayload, create_crm_and_toolcall
+from app.db.queries import cache_session, get_session
+from app.utils.responses import ORJSONFallbackResponse
+import asyncio
+import base64
 import datetime
+import io
+import logging
+import time
+from contextlib import AsyncExitStack
 import uuid
 import os
-import httpx
-from dotenv import load_dotenv
+from pathlib import Path
 
 
-load_dotenv()
-API_KEY = os.getenv("API_KEY", "voxloom_demo_api_key")
-
 # Async DB session factory
 from app.db.database import AsyncSessionLocal
 
@@ -37,12 +42,53 @@ except Exception:
 
 
 router = APIRouter()
+log = logging.getLogger("voxloom.sessions")
+
+# Constant parts of the per-message CRM payload; only the session /
+# transcript fields are filled in per call (MCPPayload copies the dicts).
+_CRM_TEMPLATE = {
+    "scenario": "billing_query",
+    "meta": {"model": "stub-llm", "confidence": 0.5},
+}
+_CRM_RECORD_TEMPLATE = {
+    "name": "Asha Sharma",
+    "phone": "+91-98xxxxxxx",
+    "intent": "request_refund",
+    "priority": "high",
+}
+
+# Incoming audio is only written to ./media/ when SAVE_AUDIO=1
+SAVE_AUDIO = os.getenv("SAVE_AUDIO", "0") == "1"
+
+def _write_disk(path: str, data: bytes) -> bool:
+    """Blocking write; returns False (and logs) if the file couldn't be written."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Path(path).write_bytes(data)
+        return True
+    except Exception:
+        log.exception("Failed to write incoming audio to disk")
+        return False
+
+def _audio_ext(mime: Optional[str], filename: Optional[str] = None) -> str:
+    """Extension for saved incoming audio: .mp3 for MP3 (audio/mpeg, audio/mp3, *.mp3), else .wav."""
+    if filename and filename.lower().endswith(".mp3"):
+        return ".mp3"
+    if mime and ("mp3" in mime.lower() or "mpeg" in mime.lower()):
+        return ".mp3"
+    return ".wav"
 
 def now_iso() -> str:
-    return datetime.datetime.utcnow().isoformat() + "Z"
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
 
 def gen_uuid() -> str:
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
+
+async def _timed(coro):
+    """Await `coro` and return (result, duration_ms)."""
+    t0 = time.perf_counter_ns()
+    result = await coro
+    return result, (time.perf_counter_ns() - t0) // 1_000_000
 
 class CreateSessionReq(BaseModel):
     customer_id: str = Field(..., example="cust_123")
@@ -77,6 +123,9 @@ async def create_session(req: CreateSessionReq):
         db.add(session_row)
         await db.commit()
 
+    # Messages for this session usually follow right away
+    cache_session(session_row)
+
     return {"session_id": session_id, "created_at": created_at}
 
 @router.post("/{session_id}/messages", status_code=201)
@@ -84,24 +133,62 @@ async def post_message(session_id: str, msg: MessageReq):
     """
     Persist an incoming message to DB.
     This now calls the local ASR + rule-based LLM (generate_reply)
-    and saves the reply into the message row. It also calls the
-    internal MCP/tool endpoint to insert a CRM record, and logs
-    ASR/LLM/TTS calls into the modelcall table.
-
-    Important change: audio bytes are saved to disk under ./media/
-    and the DB stores the path in message.audio_path_or_b64 for
+    and saves the reply into the message row. It also inserts a CRM
+    record + tool call (same logic as the internal MCP/tool endpoint)
+    and logs ASR/LLM/TTS calls into the modelcall table, all in a
+    single commit.
+
+    Audio is decoded and transcribed in memory. With SAVE_AUDIO=1 the
+    bytes are also written to ./media/ (in a worker thread) and, once
+    written, the DB stores the path in message.audio_path_or_b64 for
     backwards compatibility.
+
+    For audio, prefer POST /{session_id}/messages/audio (multipart),
+    which skips the base64 round trip.
     """
     # Validate type
     if msg.type not in ("text", "audio"):
         raise HTTPException(status_code=400, detail="type must be 'text' or 'audio'")
 
+    audio_bytes = b""
+    if msg.type == "audio" and msg.audio_base64:
+        # Decode in a worker thread — large payloads would stall the event loop
+        try:
+            audio_bytes = await asyncio.to_thread(base64.b64decode, msg.audio_base64)
+        except Exception as e:
+            log.warning("Failed to decode incoming audio: %s", e)
+
+    return await _process_message(session_id, msg.type, msg.text, audio_bytes, msg.mime)
+
+
+@router.post("/{session_id}/messages/audio", status_code=201)
+async def post_audio_message(session_id: str, audio: UploadFile = File(...)):
+    """
+    Preferred audio upload: raw bytes as multipart/form-data field `audio`.
+    No base64 inflation or decode; the MIME type comes from the part's
+    Content-Type. Same pipeline and response as POST /messages.
+    """
+    audio_bytes = await audio.read()
+    return await _process_message(
+        session_id, "audio", None, audio_bytes, audio.content_type, audio.filename
+    )
+
+
+async def _process_message(
+    session_id: str,
+    msg_type: str,
+    text: Optional[str],
+    audio_bytes: bytes,
+    mime: Optional[str],
+    filename: Optional[str] = None,
+):
+    """Shared ASR → LLM → TTS → CRM pipeline for both message endpoints."""
     message_id = gen_uuid()
     created_at = now_iso()
 
     # Prepare incoming text / transcript
-    if msg.type == "text":
-        incoming_text = msg.text or ""
+    if msg_type == "text":
+        incoming_text = text or ""
         transcript = incoming_text
         audio_path_or_b64 = None
     else:
@@ -109,31 +196,19 @@ async def post_message(session_id: str, msg: MessageReq):
         transcript = "<audio_received>"  # temporary until ASR runs
         audio_path_or_b64 = None
 
-        # If we have base64 audio, save to ./media/<message_id>.wav
-        if msg.audio_base64:
-            try:
-                import base64
-                os.makedirs("media", exist_ok=True)
-                audio_bytes = base64.b64decode(msg.audio_base64)
-                # Determine extension using MIME if provided (basic)
-                ext = ".wav"
-                if msg.mime and "mp3" in msg.mime.lower():
-                    ext = ".mp3"
-                media_filename = f"media/{message_id}{ext}"
-                with open(media_filename, "wb") as f:
-                    f.write(audio_bytes)
+        # Optionally persist to ./media/<message_id>.wav/.mp3 (in a worker thread).
+        # The path is only stored once the file is actually on disk.
+        if audio_bytes and SAVE_AUDIO:
+            media_filename = f"media/{message_id}{_audio_ext(mime, filename)}"
+            if await asyncio.to_thread(_write_disk, media_filename, audio_bytes):
                 audio_path_or_b64 = media_filename
-            except Exception as e:
-                # If writing fails, still proceed but log and keep audio as None
-                print("Failed to write incoming audio to disk:", str(e))
-                audio_path_or_b64 = None
 
     # Build message row with initial values (we'll update reply fields after pipeline)
     message_row = MessageModel(
         id=message_id,
         session_id=session_id,
         direction="incoming",
-        type=msg.type,
+        type=msg_type,
         text=incoming_text,
         audio_path_or_b64=audio_path_or_b64,
         transcript=transcript,
@@ -144,33 +219,17 @@ async def post_message(session_id: str, msg: MessageReq):
 
     async with AsyncSessionLocal() as db:
         # Check session exists and load session metadata (language/persona)
-        q = select(SessionModel).where(SessionModel.id == session_id)
-        result = await db.execute(q)
-        s = result.scalars().one_or_none()
+        s = await get_session(db, session_id)
         if s is None:
             raise HTTPException(status_code=404, detail="session not found")
 
         model_calls_to_save = []
 
         # ---- 1) ASR (if audio) ----
-        if msg.type == "audio":
-            asr_start = datetime.datetime.utcnow()
-
-            # Choose ASR input: prefer saved file path if we have it, otherwise decode base64 inline
-            asr_input_bytes = None
-            if audio_path_or_b64:
-                # we will pass the file path to run_asr (implementation can accept path)
-                asr_source = audio_path_or_b64
-            elif msg.audio_base64:
-                # fallback: decode into bytes and pass bytes (run_asr should accept bytes or base64)
-                import base64
-                asr_source = base64.b64decode(msg.audio_base64)
-            else:
-                asr_source = b""
-
-            transcript = await run_asr(asr_source, msg.mime or "audio/wav")
-            asr_end = datetime.datetime.utcnow()
-            duration_ms = int((asr_end - asr_start).total_seconds() * 1000)
+        if msg_type == "audio":
+            transcript, duration_ms = await _timed(
+                run_asr(io.BytesIO(audio_bytes), mime or "audio/wav")
+            )
 
             message_row.transcript = transcript
 
@@ -179,7 +238,7 @@ async def post_message(session_id: str, msg: MessageReq):
                 id=gen_uuid(),
                 message_id=message_id,
                 model_type="ASR",
-                model_id="Systran/faster-whisper-tiny.en",
+                model_id=ASR_MODEL_ID,
                 duration_ms=duration_ms,
                 raw_response_snippet=(transcript[:200] if isinstance(transcript, str) else None),
                 created_at=now_iso(),
@@ -187,16 +246,13 @@ async def post_message(session_id: str, msg: MessageReq):
             model_calls_to_save.append(asr_call)
 
         # ---- 2) Decide what text goes into our LLM / reply generator ----
-        if msg.type == "text":
+        if msg_type == "text":
             user_text = incoming_text or ""
         else:
             user_text = transcript or ""
 
         # ---- 3) LLM (our generate_reply) ----
-        llm_start = datetime.datetime.utcnow()
-        llm_reply = await generate_reply(user_text)
-        llm_end = datetime.datetime.utcnow()
-        llm_duration_ms = int((llm_end - llm_start).total_seconds() * 1000)
+        llm_reply, llm_duration_ms = await _timed(generate_reply(user_text))
 
         # Log LLM model call
         llm_call = ModelCallModel(
@@ -211,11 +267,8 @@ async def post_message(session_id: str, msg: MessageReq):
         model_calls_to_save.append(llm_call)
 
         # ---- 4) TTS (writes file to disk) ----
-        tts_start = datetime.datetime.utcnow()
         # We'll pass the message_id so run_tts can write the reply file named with message_id
-        tts_path = await run_tts(llm_reply, message_id=message_id)
-        tts_end = datetime.datetime.utcnow()
-        tts_duration_ms = int((tts_end - tts_start).total_seconds() * 1000)
+        tts_path, tts_duration_ms = await _timed(run_tts(llm_reply, message_id=message_id))
 
         # Log TTS model call (even if stub / None)
         tts_snippet = None
@@ -233,44 +286,34 @@ async def post_message(session_id: str, msg: MessageReq):
         )
         model_calls_to_save.append(tts_call)
 
-        # ---- 5) Update message with reply ----
-        message_row.reply_text = llm_reply
-        message_row.reply_audio_path_or_b64 = tts_path
-
-        # Save message + model calls
-        db.add(message_row)
-        for mc in model_calls_to_save:
-            db.add(mc)
-
-        await db.commit()
-
-        # ---- 6) Internal MCP / tool endpoint to create a CRM record ----
-        crm_payload = {
-            "session_id": session_id,
-            "customer_id": getattr(s, "customer_id", None) or "cust_demo",
-            "llm_response": llm_reply,
-            "scenario": "billing_query",
-            "crm_record": {
-                "name": "Asha Sharma",
-                "phone": "+91-98xxxxxxx",
+        # ---- 5) CRM record + tool call, written in the same transaction ----
+        crm_payload = MCPPayload(
+            **_CRM_TEMPLATE,
+            session_id=session_id,
+            customer_id=getattr(s, "customer_id", None) or "cust_demo",
+            llm_response=llm_reply,
+            crm_record={
+                **_CRM_RECORD_TEMPLATE,
                 "account_id": f"acc_{session_id[:8]}",
                 "query": transcript,
-                "intent": "request_refund",
-                "priority": "high",
             },
-            "meta": {"model": "stub-llm", "confidence": 0.5},
-        }
+        )
+        try:
+            await create_crm_and_toolcall(db, crm_payload, session_row=s)
+        except HTTPException as e:
+            # invalid CRM payload (e.g. empty query) — keep the message, skip the CRM rows
+            log.warning("CRM record skipped: %s", e.detail)
 
-        mcp_url = "http://127.0.0.1:8000/api/v1/tools/mcp"
-        headers = {"Authorization": f"Bearer {API_KEY}", "Content-Type": "application/json"}
+        # ---- 6) Update message with reply ----
+        message_row.reply_text = llm_reply
+        message_row.reply_audio_path_or_b64 = tts_path
 
-        # Call MCP and log status into toolcall table in the tools endpoint (we still attempt)
-        try:
-            async with httpx.AsyncClient() as client:
-                await client.post(mcp_url, json=crm_payload, headers=headers, timeout=10.0)
-        except Exception as e:
-            # avoid failing the whole request — log and continue
-            print("MCP call failed:", str(e))
+        # Save message + model calls + CRM record + tool call.
+        # All ids are preassigned, so the flush emits one executemany
+        # INSERT per table rather than one statement per row.
+        db.add_all([message_row, *model_calls_to_save])
+
+        await db.commit()
 
     # Return the persisted/processed message summary
     return {
@@ -289,45 +332,49 @@ async def get_conversation(session_id: str, response: Response):
     """
     Return messages, CRM records, and tool-calls for a session.
     """
-    async with AsyncSessionLocal() as db:
+    # Messages
+    q_msgs = select(MessageModel).where(MessageModel.session_id == session_id).order_by(MessageModel.created_at)
+    # CRM records
+    q_crm = select(CRMRecordModel).where(CRMRecordModel.session_id == session_id).order_by(CRMRecordModel.created_at)
+    # Tool calls
+    q_tools = select(ToolCallModel).where(ToolCallModel.session_id == session_id).order_by(ToolCallModel.created_at)
+    # Model calls (ASR / LLM / TTS) belonging to messages in this session
+    q_model_calls = (
+        select(ModelCallModel)
+        .join(MessageModel, ModelCallModel.message_id == MessageModel.id)
+        .where(MessageModel.session_id == session_id)
+        .order_by(ModelCallModel.created_at)
+    )
+
+    # An AsyncSession runs one statement at a time on one connection, so
+    # give each query its own pooled session and run them concurrently.
+    # The existence check reuses the first one: at most 4 connections per read.
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(AsyncSessionLocal()) for _ in range(4)]
+
         # Ensure session exists
-        q = select(SessionModel).where(SessionModel.id == session_id)
-        r = await db.execute(q)
-        session_obj = r.scalars().one_or_none()
+        session_obj = await get_session(sessions[0], session_id)
         if session_obj is None:
             response.status_code = 404
             return {"detail": "session not found"}
 
-        # Fetch messages
-        q_msgs = select(MessageModel).where(MessageModel.session_id == session_id).order_by(MessageModel.created_at)
-        r_msgs = await db.execute(q_msgs)
+        r_msgs, r_crm, r_tools, r_model_calls = await asyncio.gather(
+            sessions[0].execute(q_msgs),
+            sessions[1].execute(q_crm),
+            sessions[2].execute(q_tools),
+            sessions[3].execute(q_model_calls),
+        )
         messages = [m.dict() for m in r_msgs.scalars().all()]
-
-        # Fetch CRM records
-        q_crm = select(CRMRecordModel).where(CRMRecordModel.session_id == session_id).order_by(CRMRecordModel.created_at)
-        r_crm = await db.execute(q_crm)
         crm_records = [c.dict() for c in r_crm.scalars().all()]
-
-        # Fetch tool calls
-        q_tools = select(ToolCallModel).where(ToolCallModel.session_id == session_id).order_by(ToolCallModel.created_at)
-        r_tools = await db.execute(q_tools)
         tool_calls = [t.dict() for t in r_tools.scalars().all()]
-
-        # Fetch model calls (ASR / LLM / TTS) belonging to messages in this session
-        q_model_calls = (
-            select(ModelCallModel)
-            .join(MessageModel, ModelCallModel.message_id == MessageModel.id)
-            .where(MessageModel.session_id == session_id)
-            .order_by(ModelCallModel.created_at)
-        )
-        r_model_calls = await db.execute(q_model_calls)
         model_calls = [mc.dict() for mc in r_model_calls.scalars().all()]
 
-
-    return {
+    # Rows are already plain dicts of str/int/JSON values; returning the
+    # response directly skips FastAPI's jsonable_encoder walk over them.
+    return ORJSONFallbackResponse({
         "session": session_obj.dict(),
         "messages": messages,
         "crm_records": crm_records,
         "tool_calls": tool_calls,
         "model_calls": model_calls,
-    }
+    })
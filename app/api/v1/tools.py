@@ -3,15 +3,12 @@
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import Any, Dict, Optional
-from sqlmodel import select
 import datetime
 import uuid
 import os
 
-from dotenv import load_dotenv
-load_dotenv()
-
 from app.db.database import AsyncSessionLocal
+from app.db.queries import get_session
 
 # Import from models package (your project uses models.py + __init__.py)
 try:
@@ -34,10 +31,10 @@ router = APIRouter()
 # Utils
 # ----------------------------------------------------------------------
 def gen_uuid() -> str:
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
 
 def now_iso() -> str:
-    return datetime.datetime.utcnow().isoformat() + "Z"
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
 
 
 # ----------------------------------------------------------------------
@@ -53,14 +50,16 @@ class MCPPayload(BaseModel):
 
 
 # ----------------------------------------------------------------------
-# MCP Handler
+# CRM insert (shared by the MCP endpoint and post_message)
 # ----------------------------------------------------------------------
-@router.post("/mcp", status_code=201)
-async def mcp_handler(payload: MCPPayload, request: Request):
+async def create_crm_and_toolcall(
+    db, payload: MCPPayload, session_row: Optional[SessionModel] = None
+) -> tuple[str, str]:
     """
-    Internal MCP/tool endpoint.
-    Adds CRMRecord + ToolCall.
-    ToolCall.status is "accepted" on success, "failed" on DB error.
+    Validate the payload and add CRMRecord + ToolCall rows to `db`.
+    Does not commit — the caller owns the transaction.
+    Pass `session_row` if the session was already loaded to skip the lookup.
+    Returns (crm_record_id, tool_call_id).
     """
 
     # Validate scenario
@@ -74,55 +73,62 @@ async def mcp_handler(payload: MCPPayload, request: Request):
         if missing:
             raise HTTPException(status_code=400, detail=f"Missing crm_record fields: {missing}")
 
-    async with AsyncSessionLocal() as db:
-        # Ensure session exists
-        q = select(SessionModel).where(SessionModel.id == payload.session_id)
-        r = await db.execute(q)
-        session_row = r.scalars().one_or_none()
+    # Ensure session exists
+    if session_row is None:
+        session_row = await get_session(db, payload.session_id)
 
         if session_row is None:
             raise HTTPException(status_code=404, detail="session not found")
 
-        # Create CRMRecord
-        crm_row = CRMRecordModel(
-            id=gen_uuid(),
-            session_id=payload.session_id,
-            customer_id=payload.customer_id or session_row.customer_id,
-            scenario=payload.scenario,
-            record_json=payload.crm_record or {},
-            status="pending",
-            created_at=now_iso(),
-        )
-
-        # Create ToolCall
-        tool_row = ToolCallModel(
-            id=gen_uuid(),
-            session_id=payload.session_id,
-            payload_json=payload.dict(),
-            status="accepted",     # default, will change if fails
-            created_at=now_iso(),
-        )
+    # Create CRMRecord
+    crm_row = CRMRecordModel(
+        id=gen_uuid(),
+        session_id=payload.session_id,
+        customer_id=payload.customer_id or session_row.customer_id,
+        scenario=payload.scenario,
+        record_json=payload.crm_record or {},
+        status="pending",
+        created_at=now_iso(),
+    )
+
+    # Create ToolCall
+    tool_row = ToolCallModel(
+        id=gen_uuid(),
+        session_id=payload.session_id,
+        # unset / None fields aren't stored
+        payload_json=payload.dict(exclude_defaults=True),
+        status="accepted",
+        created_at=now_iso(),
+    )
+
+    db.add_all([crm_row, tool_row])
+
+    return crm_row.id, tool_row.id
+
+
+# ----------------------------------------------------------------------
+# MCP Handler
+# ----------------------------------------------------------------------
+@router.post("/mcp", status_code=201)
+async def mcp_handler(payload: MCPPayload, request: Request):
+    """
+    Internal MCP/tool endpoint.
+    Adds CRMRecord + ToolCall in their own transaction.
+    ToolCall.status is "accepted" on success; a DB error rolls back and returns 500.
+    """
+    async with AsyncSessionLocal() as db:
+        crm_record_id, tool_call_id = await create_crm_and_toolcall(db, payload)
 
         # Try writing DB
         try:
-            db.add(crm_row)
-            db.add(tool_row)
             await db.commit()
-
         except Exception as e:
-            # Mark tool call as failed
-            try:
-                tool_row.status = "failed"
-                db.add(tool_row)
-                await db.commit()
-            except:
-                pass
-
+            await db.rollback()
             raise HTTPException(status_code=500, detail=f"DB error: {e}")
 
     return {
         "ok": True,
-        "status": tool_row.status,
-        "crm_record_id": crm_row.id,
-        "tool_call_id": tool_row.id,
+        "status": "accepted",
+        "crm_record_id": crm_record_id,
+        "tool_call_id": tool_call_id,
     }
@@ -0,0 +1,8 @@
+# app/config.py
+"""
+Settings read once from the environment. `.env` is loaded by the entry
+point (app/main.py, app/db/init_db.py) before this module is imported.
+"""
+import os
+
+API_KEY = os.getenv("API_KEY", "voxloom_demo_api_key")
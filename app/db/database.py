@@ -1,23 +1,53 @@
 # app/db/database.py
 import os
-from dotenv import load_dotenv
 from sqlmodel import SQLModel
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-
-load_dotenv()
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL is not set. Add it to your .env file.")
 
+_url = make_url(DATABASE_URL)
+_is_sqlite = _url.get_backend_name() == "sqlite"
+
+# Keep connections hot instead of opening one per request.
+pool_kwargs = dict(
+    pool_size=20,
+    max_overflow=40,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+if _is_sqlite:
+    # aiosqlite defaults to NullPool for file databases (a new connection
+    # per session); use a real queue pool so connections and their page
+    # cache are reused. In-memory databases keep the dialect default.
+    if _url.database and _url.database != ":memory:":
+        pool_kwargs["poolclass"] = AsyncAdaptedQueuePool
+    else:
+        pool_kwargs = {}
+
 # Create async engine
 engine: AsyncEngine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    echo=False,
     future=True,
+    **pool_kwargs,
 )
 
+if _is_sqlite:
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        # WAL lets readers run alongside the writer; NORMAL sync is safe under WAL.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
 # Create an async session factory that works across SQLAlchemy versions
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -1,12 +1,15 @@
 # app/db/init_db.py
 import asyncio
 from sqlmodel import SQLModel
-from sqlmodel import SQLModel
 from typing import List
 import os
+from dotenv import load_dotenv
+
+# Standalone entry point: load .env before app.db.database reads DATABASE_URL
+load_dotenv()
 
 # Import the engine and models
-from app.db.database import engine
+from app.db.database import engine  # noqa: E402
 # import models so SQLModel metadata knows about them
 # Adjust the import path if you put models in app/models/models.py
 try:
@@ -21,6 +24,8 @@ async def init_db() -> None:
     async with engine.begin() as conn:
         # This will create tables for all SQLModel subclasses that were imported
         await conn.run_sync(SQLModel.metadata.create_all)
+    # Release pooled connections so the CLI process can exit
+    await engine.dispose()
     print("Done — tables created.")
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+# app/db/queries.py
+"""
+Shared lookups. Session rows are never updated or deleted after creation,
+so found sessions are cached per process for a few minutes and repeat
+messages skip the SELECT. The cache holds detached copies: an instance
+still bound to a request's AsyncSession would be expired by that
+session's rollback and raise DetachedInstanceError on the next hit.
+"""
+from typing import Optional
+from cachetools import TTLCache
+from sqlmodel import select
+
+from app.models import Session as SessionModel
+
+_SESSION_CACHE: "TTLCache[str, SessionModel]" = TTLCache(maxsize=10_000, ttl=300)
+
+
+def cache_session(session_row: SessionModel) -> SessionModel:
+    """Cache a detached copy of session_row and return that copy."""
+    cached = SessionModel(**session_row.dict())
+    _SESSION_CACHE[cached.id] = cached
+    return cached
+
+
+async def get_session(db, session_id: str) -> Optional[SessionModel]:
+    """Return the session row (cached, read-only) or None if it doesn't exist."""
+    session_row = _SESSION_CACHE.get(session_id)
+    if session_row is not None:
+        return session_row
+
+    q = select(SessionModel).where(SessionModel.id == session_id)
+    r = await db.execute(q)
+    session_row = r.scalars().one_or_none()
+    if session_row is None:
+        return None
+    return cache_session(session_row)
@@ -1,19 +1,46 @@
 from fastapi import FastAPI, Depends, HTTPException, Header
-import os
+from contextlib import asynccontextmanager
+import asyncio
+import hmac
+import logging
 from dotenv import load_dotenv
 
-
+# Load .env once, before any app module reads the environment
 load_dotenv()
-API_KEY = os.getenv("API_KEY", "voxloom_demo_api_key")
+
+from app.config import API_KEY  # noqa: E402
+from app.services.ai_pipeline import warmup_asr  # noqa: E402
+from app.utils.log import start_logging, stop_logging  # noqa: E402
+from app.utils.responses import ORJSONFallbackResponse  # noqa: E402
+from app.db.database import engine  # noqa: E402
+
+log = logging.getLogger("voxloom.main")
+
+# Encoded once; compare_digest on bytes also accepts non-ASCII tokens
+_API_KEY_BYTES = API_KEY.encode()
 
 async def require_api_key(authorization: str | None = Header(None)):
     if authorization is None or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
     token = authorization.split(" ", 1)[1]
-    if token != API_KEY:
+    if not hmac.compare_digest(token.encode(), _API_KEY_BYTES):
         raise HTTPException(status_code=403, detail="Invalid API key")
 
-app = FastAPI(title="VoxLoom Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener = start_logging()
+    # Take the ASR cold-start hit here instead of on the first user request
+    try:
+        await asyncio.to_thread(warmup_asr)
+    except Exception:
+        # don't block startup; run_asr will report the error per request
+        log.exception("ASR warmup failed")
+    yield
+    # Close pooled DB connections so their driver threads don't hold up exit
+    await engine.dispose()
+    stop_logging(log_listener)
+
+app = FastAPI(title="VoxLoom Backend", lifespan=lifespan, default_response_class=ORJSONFallbackResponse)
 
 # import routers
 from app.api.v1 import sessions, tools
@@ -1,14 +1,15 @@
 # app/models/models.py
 from typing import Optional, Dict
 from sqlmodel import SQLModel, Field, Column, JSON
-from datetime import datetime
+from sqlalchemy import Index
+from datetime import datetime, timezone
 import uuid
 
 def gen_uuid() -> str:
-    return str(uuid.uuid4())
+    return uuid.uuid4().hex
 
 def now_iso() -> str:
-    return datetime.utcnow().isoformat() + "Z"
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
 
 # Sessions table
 class Session(SQLModel, table=True):
@@ -21,8 +22,11 @@ class Session(SQLModel, table=True):
 
 # Messages table
 class Message(SQLModel, table=True):
+    # (session_id, created_at) serves the per-session lookup and its ORDER BY
+    __table_args__ = (Index("ix_message_session_created", "session_id", "created_at"),)
+
     id: str = Field(default_factory=gen_uuid, primary_key=True, index=True)
-    session_id: str = Field(index=True)
+    session_id: str
     direction: Optional[str] = Field(default="incoming")  # incoming / outgoing
     type: Optional[str] = None  # text / audio
     text: Optional[str] = None
@@ -34,8 +38,10 @@ class Message(SQLModel, table=True):
 
 # Model calls (ASR / LLM / TTS)
 class ModelCall(SQLModel, table=True):
+    __table_args__ = (Index("ix_modelcall_message_created", "message_id", "created_at"),)
+
     id: str = Field(default_factory=gen_uuid, primary_key=True, index=True)
-    message_id: Optional[str] = Field(default=None, index=True)
+    message_id: Optional[str] = None
     model_type: Optional[str] = None  # ASR | LLM | TTS
     model_id: Optional[str] = None
     duration_ms: Optional[int] = None
@@ -44,8 +50,10 @@ class ModelCall(SQLModel, table=True):
 
 # CRM records written by MCP/tool
 class CRMRecord(SQLModel, table=True):
+    __table_args__ = (Index("ix_crmrecord_session_created", "session_id", "created_at"),)
+
     id: str = Field(default_factory=gen_uuid, primary_key=True, index=True)
-    session_id: Optional[str] = Field(default=None, index=True)
+    session_id: Optional[str] = None
     customer_id: Optional[str] = None
     scenario: Optional[str] = None
     record_json: Optional[Dict] = Field(sa_column=Column(JSON), default=None)
@@ -54,8 +62,10 @@ class CRMRecord(SQLModel, table=True):
 
 # Tool calls log
 class ToolCall(SQLModel, table=True):
+    __table_args__ = (Index("ix_toolcall_session_created", "session_id", "created_at"),)
+
     id: str = Field(default_factory=gen_uuid, primary_key=True, index=True)
-    session_id: Optional[str] = Field(default=None, index=True)
+    session_id: Optional[str] = None
     payload_json: Optional[Dict] = Field(sa_column=Column(JSON), default=None)
     status: Optional[str] = Field(default="accepted")
     created_at: str = Field(default_factory=now_iso)
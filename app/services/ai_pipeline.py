@@ -5,33 +5,99 @@ Local ASR using faster-whisper, plus small stubs for LLM / TTS.
 We now use a proper CTranslate2 model:
   - Systran/faster-whisper-tiny.en  (English, small, works with faster-whisper)
 
-run_asr(audio_base64, mime) -> transcript string
-- decodes base64 audio into a temp WAV file
-- transcribes using faster-whisper (CPU, int8)
-- cleans up temp file and returns joined transcript
+run_asr(source, mime) -> transcript string
+- accepts a file path, raw bytes, a file object or a numpy array (no temp file)
+- transcribes using faster-whisper (int8, VAD-filtered) in a worker thread
+- model / device / threads are configurable via ASR_* env vars
 
 run_llm / run_tts remain simple stubs for now.
 """
+import io
+import logging
 import os
+import re
 import base64
 import tempfile
 import asyncio
+import functools
+from pathlib import Path
 from typing import Optional
-from dotenv import load_dotenv
 import asyncio
 import os
 import base64
-from typing import Union
+from typing import BinaryIO, Union
 
-load_dotenv()
+log = logging.getLogger("voxloom.ai_pipeline")
 
 try:
     from faster_whisper import WhisperModel
 except Exception:
     WhisperModel = None
 
+try:
+    import numpy as np  # installed with faster-whisper
+except Exception:
+    np = None
+
+try:
+    from faster_whisper import BatchedInferencePipeline  # faster-whisper >= 1.1
+except Exception:
+    BatchedInferencePipeline = None
+
 _MODEL = None
-MODEL_ID = "Systran/faster-whisper-tiny.en"  # IMPORTANT: CTranslate2 model, not openai/whisper-small
+_PIPELINE = None
+# IMPORTANT: must be a CTranslate2 model, not openai/whisper-small.
+# e.g. ASR_MODEL_ID=Systran/faster-distil-whisper-small.en for distil-whisper.
+MODEL_ID = os.getenv("ASR_MODEL_ID") or "Systran/faster-whisper-tiny.en"
+ASR_DEVICE = os.getenv("ASR_DEVICE") or "cpu"  # cpu | cuda
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE") or (
+    "int8_float16" if ASR_DEVICE == "cuda" else "int8"
+)
+ASR_CPU_THREADS = int(os.getenv("ASR_CPU_THREADS") or 0) or (os.cpu_count() or 0)
+ASR_NUM_WORKERS = int(os.getenv("ASR_NUM_WORKERS") or 2)
+# Skip silent frames before decoding
+ASR_VAD_PARAMETERS = dict(min_silence_duration_ms=500)
+# VAD chunks of one clip decoded per encoder batch (BatchedInferencePipeline)
+ASR_BATCH_SIZE = int(os.getenv("ASR_BATCH_SIZE") or 8)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Intent keywords, matched as substrings ("charge" also covers "charges", "fee" covers "fees").
+_INTENT_RE = re.compile(
+    r"(?P<refund>refund|money back)"
+    r"|(?P<bill>bill|charge|amount|invoice|fee)"
+)
+
+_REPLY_EMPTY = (
+    "I couldn't clearly understand the audio. "
+    "Could you please repeat your question about your bill or refund?"
+)
+_REPLY_REFUND = (
+    "I understand you’d like a refund for your recent bill. "
+    "I’ve marked this as a refund request with high priority. "
+    "You’ll receive an update on the refund status within 3–5 business days."
+)
+_REPLY_BILL = (
+    "I can help explain your bill. "
+    "Your latest invoice usually includes your base plan, taxes, "
+    "and any extra usage or late fees. "
+    "If you’d like, I can break down the charges for the last billing cycle."
+)
+_REPLY_FALLBACK = (
+    "Thanks for your question. "
+    "I’ve logged your request and linked it to your account. "
+    "Someone from the billing team will review it and get back to you soon."
+)
+
+
+# Longer (normalized) texts are rare repeats; caching them would only hold memory
+_REPLY_CACHE_MAX_CHARS = 512
+
+
+def _normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so equivalent utterances share a cache key."""
+    return _WHITESPACE_RE.sub(" ", text.strip().lower())
+
 
 # Simple rule-based "LLM" – no external API.
 async def generate_reply(user_text: str) -> str:
@@ -42,108 +108,174 @@ async def generate_reply(user_text: str) -> str:
     - If it clearly mentions a refund: send a refund-style reply.
     - If it clearly mentions bill/charges/amount/invoice: send a bill-explanation reply.
     - Otherwise: generic fallback reply.
+
+    Replies are deterministic, so short texts are memoized on their
+    normalized form; longer ones skip the cache so it can't pin large keys.
     """
+    text = _normalize_text(user_text or "")
+    if len(text) > _REPLY_CACHE_MAX_CHARS:
+        return _reply_for(text)
+    return _reply_for_cached(text)
+
+
+def _reply_for(text: str) -> str:
     # 1) No transcript / empty text
-    if not user_text or user_text.strip() == "":
-        return (
-            "I couldn't clearly understand the audio. "
-            "Could you please repeat your question about your bill or refund?"
-        )
+    if text == "":
+        return _REPLY_EMPTY
 
-    text = user_text.lower().strip()
+    # One pass over the text; a refund keyword anywhere wins over bill keywords.
+    intent = None
+    for m in _INTENT_RE.finditer(text):
+        if m.lastgroup == "refund":
+            intent = "refund"
+            break
+        intent = "bill"
 
     # 2) Refund-related
-    if "refund" in text or "money back" in text:
-        return (
-            "I understand you’d like a refund for your recent bill. "
-            "I’ve marked this as a refund request with high priority. "
-            "You’ll receive an update on the refund status within 3–5 business days."
-        )
+    if intent == "refund":
+        return _REPLY_REFUND
 
     # 3) Bill / charges related
-    if (
-        "bill" in text
-        or "charge" in text
-        or "charges" in text
-        or "amount" in text
-        or "invoice" in text
-        or "fees" in text
-        or "fee" in text
-    ):
-        return (
-            "I can help explain your bill. "
-            "Your latest invoice usually includes your base plan, taxes, "
-            "and any extra usage or late fees. "
-            "If you’d like, I can break down the charges for the last billing cycle."
-        )
+    if intent == "bill":
+        return _REPLY_BILL
 
     # 4) Generic fallback
-    return (
-        "Thanks for your question. "
-        "I’ve logged your request and linked it to your account. "
-        "Someone from the billing team will review it and get back to you soon."
-    )
+    return _REPLY_FALLBACK
+
+_reply_for_cached = functools.lru_cache(maxsize=4096)(_reply_for)
 
 def _get_model():
     global _MODEL
     if _MODEL is None:
         if WhisperModel is None:
             raise RuntimeError("faster-whisper not installed")
-        # CTranslate2 model, CPU, 8-bit compute
-        _MODEL = WhisperModel(MODEL_ID, device="cpu", compute_type="int8")
+        # CTranslate2 model, 8-bit weights (int8 on CPU, int8_float16 on GPU)
+        _MODEL = WhisperModel(
+            MODEL_ID,
+            device=ASR_DEVICE,
+            compute_type=ASR_COMPUTE_TYPE,
+            cpu_threads=ASR_CPU_THREADS,
+            num_workers=ASR_NUM_WORKERS,
+        )
     return _MODEL
 
-async def run_asr(source: Union[str, bytes], mime: str = "audio/wav") -> str:
+def _get_pipeline():
+    """Batched pipeline over the shared model, or None on older faster-whisper."""
+    global _PIPELINE
+    if _PIPELINE is None and BatchedInferencePipeline is not None:
+        _PIPELINE = BatchedInferencePipeline(model=_get_model())
+    return _PIPELINE
+
+def _transcribe(source) -> str:
+    """Blocking faster-whisper call; run it off the event loop."""
+    pipeline = _get_pipeline()
+    if pipeline is not None:
+        # decodes the clip's VAD chunks as one encoder batch
+        segments, _info = pipeline.transcribe(
+            source,
+            batch_size=ASR_BATCH_SIZE,
+            vad_filter=True,
+            vad_parameters=ASR_VAD_PARAMETERS,
+        )
+    else:
+        segments, _info = _get_model().transcribe(
+            source, vad_filter=True, vad_parameters=ASR_VAD_PARAMETERS
+        )
+    return " ".join(s.text.strip() for s in segments).strip()
+
+def warmup_asr() -> bool:
+    """
+    Load the model and run one dummy transcription so weights are mapped
+    and kernels are hot before the first real request. Blocking; returns
+    False if faster-whisper isn't installed.
+    """
+    if WhisperModel is None:
+        return False
+
+    # 1 s of 16 kHz silence; VAD off so the encoder actually runs.
+    segments, _info = _get_model().transcribe(np.zeros(16000, dtype=np.float32))
+    for _ in segments:
+        pass
+    return True
+
+def _rewind_and_size(fileobj: BinaryIO) -> Optional[int]:
+    """Seek fileobj to its start and return its size, or None if it can't seek."""
+    try:
+        fileobj.seek(0, io.SEEK_END)
+        size = fileobj.tell()
+        fileobj.seek(0)
+    except (AttributeError, OSError, ValueError):
+        return None
+    return size
+
+async def run_asr(
+    source: Union[str, bytes, BinaryIO, "np.ndarray"], mime: str = "audio/wav"
+) -> str:
     """
-    Run ASR on either a filepath (str) or bytes.
-    Returns transcript string. This currently uses a small OSS model if available,
-    otherwise returns '<empty_transcript>' for silence/unknown.
+    Run ASR on a filepath (str), raw bytes, a binary file object
+    (anything with .read, e.g. BytesIO or UploadFile.file) or a float32
+    16 kHz numpy array.
+    Returns transcript string. This uses faster-whisper if installed,
+    otherwise a placeholder transcript; '<empty_transcript>' for silence/unknown.
     """
-    # If source is a path, call the underlying model with the path
     try:
-        # If you have faster-whisper or other model, call it here.
-        # Sample pseudo-code:
-        # if isinstance(source, str):
-        #     model = WhisperModel("Systran/faster-whisper-tiny.en")
-        #     segments, info = model.transcribe(source)
-        #     return " ".join([s.text for s in segments]).strip()
-        # elif isinstance(source, (bytes, bytearray)):
-        #     # write to tmp file then transcribe
-        #     tmp_path = f"/tmp/asr_{uuid.uuid4().hex}.wav"
-        #     with open(tmp_path, "wb") as f:
-        #         f.write(source)
-        #     segments, info = model.transcribe(tmp_path)
-        #     os.remove(tmp_path)
-        #     return " ".join([s.text for s in segments]).strip()
-
-        # Fallback stub: if a file path, try to read a predetermined transcript file
+        # Missing / empty input never reaches the model
         if isinstance(source, str):
-            # as a crude heuristic, return a fake transcript if file exists
-            if os.path.exists(source):
-                # If you want to run a real ASR, implement above using HF/faster-whisper
-                # For now, return a placeholder if file size > 0
-                if os.path.getsize(source) > 0:
-                    # In actual usage this will be replaced by real model result
-                    return "<transcript_from_asr_pending_real_model>"
-                else:
-                    return "<empty_transcript>"
-            else:
+            if not os.path.exists(source) or os.path.getsize(source) == 0:
                 return "<empty_transcript>"
         elif isinstance(source, (bytes, bytearray)):
             if len(source) == 0:
                 return "<empty_transcript>"
-            # Otherwise, we could write to a temp and transcribe similarly (omitted)
-            return "<transcript_from_asr_pending_real_model>"
+            # faster-whisper takes file-like objects, no temp file needed
+            source = io.BytesIO(source)
+        elif np is not None and isinstance(source, np.ndarray):
+            if source.size == 0:
+                return "<empty_transcript>"
+        elif hasattr(source, "read"):
+            # BytesIO, UploadFile.file (SpooledTemporaryFile), open() handles...
+            if _rewind_and_size(source) == 0:
+                return "<empty_transcript>"
         else:
+            log.warning("Unsupported ASR source type: %s", type(source).__name__)
             return "<empty_transcript>"
-    except Exception as e:
-        print("ASR error:", e)
+
+        if WhisperModel is None:
+            # In actual usage this will be replaced by real model result
+            return "<transcript_from_asr_pending_real_model>"
+
+        # One worker thread per request; the model's num_workers lets
+        # concurrent clips run in parallel
+        transcript = await asyncio.to_thread(_transcribe, source)
+        return transcript or "<empty_transcript>"
+    except Exception:
+        log.exception("ASR error")
         return "<empty_transcript>"
 
 async def run_llm(prompt: str) -> str:
     # Reuse our simple rule-based generator
     return await generate_reply(prompt)
 
+def _build_silence_wav(framerate: int = 16000, duration_s: float = 1.0) -> bytes:
+    """Encode a short silent mono 16-bit WAV so clients can play something."""
+    import wave
+
+    nframes = int(framerate * duration_s)
+    sampwidth = 2
+    nchannels = 1
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wf:
+        wf.setnchannels(nchannels)
+        wf.setsampwidth(sampwidth)
+        wf.setframerate(framerate)
+        # produce silence (all zeros)
+        silence = (b"\x00" * sampwidth) * nframes
+        wf.writeframes(silence)
+    return buf.getvalue()
+
+# Every stub reply is the same audio, so encode it once at import
+_SILENCE_WAV_BYTES = _build_silence_wav(framerate=16000, duration_s=1.0)
+
 async def run_tts(text: str, message_id: str | None = None) -> Union[str, None]:
     """
     Stub TTS: writes a small placeholder WAV file to media/reply_{message_id}.wav
@@ -155,27 +287,11 @@ async def run_tts(text: str, message_id: str | None = None) -> Union[str, None]:
             message_id = "tts_" + os.urandom(6).hex()
         out_path = f"media/reply_{message_id}.wav"
 
-        # Create a 1kHz short beep or silence WAV so clients can play something.
-        # We'll create a short silent WAV using the wave module.
-        import wave
-        import struct
-
-        framerate = 16000
-        duration_s = 1.0
-        nframes = int(framerate * duration_s)
-        sampwidth = 2
-        nchannels = 1
-
-        with wave.open(out_path, "wb") as wf:
-            wf.setnchannels(nchannels)
-            wf.setsampwidth(sampwidth)
-            wf.setframerate(framerate)
-            # produce silence (all zeros)
-            silence = (b"\x00" * sampwidth) * nframes
-            wf.writeframes(silence)
+        # File I/O runs in a worker thread to keep the event loop free
+        await asyncio.to_thread(Path(out_path).write_bytes, _SILENCE_WAV_BYTES)
 
         # Return the relative path so callers can read the file
         return out_path
-    except Exception as e:
-        print("TTS error:", e)
+    except Exception:
+        log.exception("TTS error")
         return None
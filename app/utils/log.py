@@ -0,0 +1,41 @@
+# app/utils/log.py
+"""
+Non-blocking logging for the "voxloom" logger tree.
+
+Request handlers only enqueue records; a QueueListener thread does the
+stream writes, so a slow stderr never stalls the event loop.
+Modules log via logging.getLogger("voxloom.<area>").
+"""
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+LOGGER_NAME = "voxloom"
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def start_logging(level: int = logging.INFO) -> QueueListener:
+    """Attach a QueueHandler to the voxloom logger and start its listener thread."""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.addHandler(QueueHandler(log_queue))
+    logger.propagate = False
+
+    listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def stop_logging(listener: QueueListener) -> None:
+    """Flush queued records and detach the queue handler."""
+    listener.stop()
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        if isinstance(handler, QueueHandler):
+            logger.removeHandler(handler)
+    logger.propagate = True
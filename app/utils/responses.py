@@ -0,0 +1,17 @@
+# app/utils/responses.py
+"""
+JSON responses rendered with orjson, falling back to the stdlib encoder
+for bodies orjson refuses (integers outside the 64-bit range, which
+stored CRM/tool-call JSON may contain).
+"""
+from typing import Any
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+
+class ORJSONFallbackResponse(ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        try:
+            return super().render(content)
+        except TypeError:
+            # orjson.JSONEncodeError subclasses TypeError
+            return JSONResponse.render(self, content)
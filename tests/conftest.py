@@ -0,0 +1,46 @@
+# tests/conftest.py
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# app.db.database reads DATABASE_URL at import time; point it at a scratch file
+_DB_DIR = tempfile.mkdtemp(prefix="voxloom-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_DB_DIR}/test.db"
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """TestClient for the app (lifespan included) with the API key set.
+
+    Runs from tmp_path so TTS / SAVE_AUDIO files land in a scratch media/.
+    """
+    from fastapi.testclient import TestClient
+    from sqlmodel import SQLModel
+
+    from app.config import API_KEY
+    from app.db.database import engine
+    from app.main import app
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        await engine.dispose()
+
+    monkeypatch.chdir(tmp_path)
+    asyncio.run(create_tables())
+    with TestClient(app) as test_client:
+        test_client.headers["Authorization"] = f"Bearer {API_KEY}"
+        yield test_client
+
+
+@pytest.fixture
+def session_id(client):
+    r = client.post("/api/v1/sessions", json={"customer_id": "cust-1", "language": "en", "channel": "phone"})
+    assert r.status_code == 201
+    return r.json()["session_id"]
@@ -0,0 +1,30 @@
+# tests/test_conversation.py
+
+
+def test_conversation_round_trips_large_integers(client, session_id):
+    # orjson rejects ints outside 64 bits; the stored JSON may still hold them
+    big = 10**20
+    r = client.post(
+        "/api/v1/tools/mcp",
+        json={
+            "session_id": session_id,
+            "customer_id": None,
+            "llm_response": "noted",
+            "scenario": "other",
+            "crm_record": {"n": big},
+        },
+    )
+    assert r.status_code == 201
+
+    r = client.get(f"/api/v1/sessions/{session_id}/conversation")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["session"]["id"] == session_id
+    assert body["crm_records"][0]["record_json"] == {"n": big}
+    assert body["tool_calls"][0]["payload_json"]["crm_record"] == {"n": big}
+
+
+def test_conversation_unknown_session_is_404(client):
+    r = client.get("/api/v1/sessions/does-not-exist/conversation")
+    assert r.status_code == 404
+    assert r.json() == {"detail": "session not found"}
@@ -0,0 +1,67 @@
+# tests/test_messages.py
+from pathlib import Path
+
+from app.api.v1 import sessions
+
+
+def test_multipart_audio_upload(client, session_id):
+    r = client.post(
+        f"/api/v1/sessions/{session_id}/messages/audio",
+        files={"audio": ("clip.wav", b"RIFF\x00\x00\x00\x00WAVE", "audio/wav")},
+    )
+    assert r.status_code == 201
+    body = r.json()
+    assert body["session_id"] == session_id
+    assert body["incoming_text"] is None
+    assert body["reply_audio_path"] == f"media/reply_{body['message_id']}.wav"
+
+    convo = client.get(f"/api/v1/sessions/{session_id}/conversation").json()
+    assert [m["type"] for m in convo["messages"]] == ["audio"]
+    assert {mc["model_type"] for mc in convo["model_calls"]} == {"ASR", "LLM", "TTS"}
+
+
+def test_multipart_audio_unknown_session_is_404(client):
+    r = client.post(
+        "/api/v1/sessions/does-not-exist/messages/audio",
+        files={"audio": ("clip.wav", b"RIFF", "audio/wav")},
+    )
+    assert r.status_code == 404
+
+
+def test_saved_mp3_upload_keeps_mp3_extension(client, session_id, monkeypatch):
+    monkeypatch.setattr(sessions, "SAVE_AUDIO", True)
+    r = client.post(
+        f"/api/v1/sessions/{session_id}/messages/audio",
+        files={"audio": ("clip.mp3", b"ID3\x03\x00", "audio/mpeg")},
+    )
+    assert r.status_code == 201
+    message_id = r.json()["message_id"]
+
+    convo = client.get(f"/api/v1/sessions/{session_id}/conversation").json()
+    assert convo["messages"][0]["audio_path_or_b64"] == f"media/{message_id}.mp3"
+    assert Path(f"media/{message_id}.mp3").read_bytes() == b"ID3\x03\x00"
+
+
+def test_text_message_writes_crm_and_tool_call(client, session_id):
+    r = client.post(f"/api/v1/sessions/{session_id}/messages", json={"type": "text", "text": "Why is my bill so high?"})
+    assert r.status_code == 201
+
+    convo = client.get(f"/api/v1/sessions/{session_id}/conversation").json()
+    assert len(convo["messages"]) == 1
+    assert {mc["model_type"] for mc in convo["model_calls"]} == {"LLM", "TTS"}
+    assert [c["record_json"]["query"] for c in convo["crm_records"]] == ["Why is my bill so high?"]
+    assert len(convo["tool_calls"]) == 1
+
+
+def test_empty_text_message_skips_crm_rows(client, session_id):
+    # Empty text leaves the billing record without `query`; only the CRM rows are dropped
+    r = client.post(f"/api/v1/sessions/{session_id}/messages", json={"type": "text", "text": ""})
+    assert r.status_code == 201
+    message_id = r.json()["message_id"]
+
+    convo = client.get(f"/api/v1/sessions/{session_id}/conversation").json()
+    assert [m["id"] for m in convo["messages"]] == [message_id]
+    assert convo["messages"][0]["reply_text"] == r.json()["reply_text"]
+    assert len(convo["model_calls"]) == 2
+    assert convo["crm_records"] == []
+    assert convo["tool_calls"] == []
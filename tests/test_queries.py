@@ -0,0 +1,79 @@
+# tests/test_queries.py
+import asyncio
+
+from sqlmodel import SQLModel, select
+
+from app.db import queries
+from app.db.database import AsyncSessionLocal, engine
+from app.db.queries import cache_session, get_session
+from app.models import Session as SessionModel
+
+
+def _run(coro):
+    async def wrapper():
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        try:
+            await coro
+        finally:
+            queries._SESSION_CACHE.clear()
+            await engine.dispose()
+
+    asyncio.run(wrapper())
+
+
+async def _insert_session(customer_id: str) -> SessionModel:
+    row = SessionModel(customer_id=customer_id, language="en", channel="phone")
+    async with AsyncSessionLocal() as db:
+        db.add(row)
+        await db.commit()
+    return row
+
+
+def test_cached_session_survives_rollback():
+    async def scenario():
+        row = await _insert_session("cust-rollback")
+
+        # Cache miss: loaded through a session that then rolls back
+        async with AsyncSessionLocal() as db:
+            loaded = await get_session(db, row.id)
+            await db.rollback()
+        assert loaded.customer_id == "cust-rollback"
+
+        # Cache hit from a later request
+        async with AsyncSessionLocal() as db:
+            cached = await get_session(db, row.id)
+        assert cached.customer_id == "cust-rollback"
+        assert cached.dict()["id"] == row.id
+
+    _run(scenario())
+
+
+def test_session_cached_after_create_survives_rollback():
+    async def scenario():
+        row = SessionModel(customer_id="cust-created", language="en", channel="web")
+        async with AsyncSessionLocal() as db:
+            db.add(row)
+            await db.commit()
+            session_id = row.id
+            # Same flow as create_session: cache the row it just committed
+            cache_session(row)
+            # A later statement in the same request fails and rolls back
+            await db.execute(select(SessionModel))
+            await db.rollback()
+
+        async with AsyncSessionLocal() as db:
+            cached = await get_session(db, session_id)
+        assert cached.channel == "web"
+        assert cached.dict()["customer_id"] == "cust-created"
+
+    _run(scenario())
+
+
+def test_missing_session_is_not_cached():
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            assert await get_session(db, "does-not-exist") is None
+        assert "does-not-exist" not in queries._SESSION_CACHE
+
+    _run(scenario())